@@ -7,19 +7,94 @@ Uses CSV for label storage.
 """
 
 import os
+import sys
+import csv
+import copy
+import json
 import pathlib
+import tempfile
+import threading
+import traceback
 import yaml
-import pandas as pd
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
-from io import BytesIO
-from label_generator import LabelGenerator
+from contextlib import contextmanager
+from datetime import datetime
+from flask import Flask, Response, make_response, render_template, request, jsonify, redirect, url_for
+from flask.json.provider import JSONProvider
+from label_generator import LabelGenerator, split_subcategories
+
+# Prefer the libyaml-backed loader/dumper, fall back to pure Python
+try:
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
+
+# orjson is optional; without it Flask's stdlib-json provider is used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (jsonify, request JSON, tojson)."""
+    
+    # Match Flask's default provider, which sorts keys
+    options = 0 if orjson is None else orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.options).decode("utf-8")
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.options), mimetype="application/json")
+
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 
 # Paths
 DATA_DIR = pathlib.Path(__file__).parent / "data"
 CONFIG_FILE = DATA_DIR / "label_config.yaml"
 LABELS_FILE = DATA_DIR / "binder_labels.csv"
+CONFIG_CACHE_FILE = DATA_DIR / "label_config.cache.json"
+
+LABEL_COLUMNS = ["Category", "ShortCode", "StartYear", "Subcategories", "Format"]
+
+# Parsed config and labels, re-read only when their file's (mtime, size) changes
+_CONFIG_CACHE = {"source": None, "data": None}
+_LABELS_CACHE = {"source": None, "labels": None}
+
+
+@contextmanager
+def _atomic_open(path, newline=None):
+    """
+    Open a temporary file next to path for writing and move it into place
+    with os.replace once the block completes, so readers never see a
+    partially written file. Each call gets its own temporary file, so
+    concurrent writers cannot truncate or move each other's output.
+    """
+    f = tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", newline=newline, buffering=1 << 16,
+        dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False
+    )
+    tmp_path = pathlib.Path(f.name)
+    try:
+        with f:
+            yield f
+        # Temporary files are created 0600, keep the mode of the file we replace
+        try:
+            mode = path.stat().st_mode & 0o777
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
 
 
 def ensure_data_directory():
@@ -90,70 +165,262 @@ def ensure_data_directory():
                 }
             }
         }
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            yaml.dump(default_config, f, default_flow_style=False, allow_unicode=True)
+        with _atomic_open(CONFIG_FILE) as f:
+            yaml.dump(default_config, f, Dumper=_Dumper, default_flow_style=False, allow_unicode=True)
         print(f"✓ Created default config: {CONFIG_FILE}")
     
     # Create sample labels CSV if it doesn't exist
     if not LABELS_FILE.exists():
-        sample_df = pd.DataFrame({
-            "Category": ["Finance", "Insurance", "Notfall", "Projects"],
-            "ShortCode": ["FIN", "INS", "ICE", "PRJ"],
-            "StartYear": [2012, 2004, 2020, 1999],
-            "Subcategories": [
-                "Taxes;Payroll;Bank",
-                "Liability;Home;Car",
-                "Passports;Certificates;Insurance IDs",
-                "Building permit;Offers;Invoices"
-            ],
-            "Format": ["normal", "normal", "normal", "normal"]
-        })
-        sample_df.to_csv(LABELS_FILE, index=False)
+        sample_labels = [
+            {"Category": "Finance", "ShortCode": "FIN", "StartYear": 2012,
+             "Subcategories": "Taxes;Payroll;Bank", "Format": "normal"},
+            {"Category": "Insurance", "ShortCode": "INS", "StartYear": 2004,
+             "Subcategories": "Liability;Home;Car", "Format": "normal"},
+            {"Category": "Notfall", "ShortCode": "ICE", "StartYear": 2020,
+             "Subcategories": "Passports;Certificates;Insurance IDs", "Format": "normal"},
+            {"Category": "Projects", "ShortCode": "PRJ", "StartYear": 1999,
+             "Subcategories": "Building permit;Offers;Invoices", "Format": "normal"}
+        ]
+        save_labels(sample_labels)
         print(f"✓ Created sample labels CSV: {LABELS_FILE}")
 
 
-def load_config():
-    """Load configuration from YAML file."""
+def _file_source(path):
+    """
+    Identify a file's current contents by (mtime_ns, size). The size catches
+    rewrites within one timestamp tick (coarse clocks, FAT/SMB data dirs),
+    which matters when other workers hold their own caches.
+    """
+    st = path.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _write_config_cache(config, source):
+    """
+    Write the JSON copy of the config that load_config prefers over the YAML,
+    stamped with the source of the YAML it mirrors. Best effort: a read-only
+    data directory just means the YAML is parsed on every change.
+    """
+    payload = {"source": source, "config": config}
+    # Not app.json, which sorts keys: the cache must keep the YAML's key order
+    if orjson is not None:
+        data = orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    else:
+        data = json.dumps(payload, ensure_ascii=False)
+    try:
+        with _atomic_open(CONFIG_CACHE_FILE) as f:
+            f.write(data)
+    except OSError:
+        pass
+
+
+def _read_config(source):
+    """Read the config from the JSON cache if it mirrors this YAML source, else from YAML."""
+    try:
+        with open(CONFIG_CACHE_FILE, "r", encoding="utf-8") as f:
+            cached = app.json.loads(f.read())
+        # Exact match: a restored backup can carry an older mtime than the cache
+        if cached["source"] == source:
+            return cached["config"]
+    except (OSError, ValueError, KeyError, TypeError):
+        # Missing or unreadable cache, fall through to the YAML file
+        pass
+    
     with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+        config = yaml.load(f, Loader=_Loader)
+    _write_config_cache(config, source)
+    return config
+
+
+def load_config():
+    """Load configuration from YAML file (cached until the file changes)."""
+    source = _file_source(CONFIG_FILE)
+    if _CONFIG_CACHE["source"] != source:
+        _CONFIG_CACHE["data"] = _read_config(source)
+        _CONFIG_CACHE["source"] = source
+    # Handlers mutate the config they get, so never hand out the cached dict
+    return copy.deepcopy(_CONFIG_CACHE["data"])
 
 
 def save_config(config):
     """Save configuration to YAML file."""
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+    with _atomic_open(CONFIG_FILE) as f:
+        yaml.dump(config, f, Dumper=_Dumper, default_flow_style=False, allow_unicode=True)
+    # The next load_config parses the new YAML and refreshes the JSON cache
+    # from it, so both always agree on key order
+    _CONFIG_CACHE["source"] = None
+    with _GENERATORS_LOCK:
+        _GENERATORS.clear()
+
+
+# Serialized config -> LabelGenerator, for the few most recently used configs
+_GENERATORS = {}
+_GENERATORS_LOCK = threading.Lock()
+_MAX_GENERATORS = 4
+
+
+def get_generator(config):
+    """Return a LabelGenerator for config, reusing one built from an identical config."""
+    # Not sorted: key order matters, the first label size is the fallback format
+    key = json.dumps(config)
+    with _GENERATORS_LOCK:
+        generator = _GENERATORS.pop(key, None)
+        if generator is None:
+            generator = LabelGenerator(copy.deepcopy(config))
+            if len(_GENERATORS) >= _MAX_GENERATORS:
+                del _GENERATORS[next(iter(_GENERATORS))]
+        # Re-insert so the dict stays ordered from least to most recently used
+        _GENERATORS[key] = generator
+    return generator
 
 
-def load_labels():
-    """Load labels from CSV file."""
-    if LABELS_FILE.exists():
-        return pd.read_csv(LABELS_FILE)
-    return pd.DataFrame(columns=["Category", "ShortCode", "StartYear", "Subcategories", "Format"])
+# Page templates only change on deploy, so their newest mtime is read once
+_TEMPLATES_MTIME = max(
+    (p.stat().st_mtime_ns for p in (pathlib.Path(app.root_path) / app.template_folder).glob("*.html")),
+    default=0
+)
 
 
-def save_labels(df):
+def _page_etag(*paths):
+    """ETag for a page rendered only from the given data files and the templates."""
+    parts = [_TEMPLATES_MTIME]
+    for path in paths:
+        try:
+            parts.extend(_file_source(path))
+        except FileNotFoundError:
+            parts.extend((0, 0))
+    return "-".join(str(p) for p in parts)
+
+
+def _page_response(body, etag):
+    """Wrap a rendered page (or None for 304 Not Modified) with its ETag."""
+    response = make_response(body) if body is not None else Response(status=304)
+    response.set_etag(etag)
+    # Let browsers keep the page but always revalidate it
+    response.cache_control.no_cache = True
+    return response
+
+
+def _request_data():
+    """Parse the request body as a JSON object, without caching it on the request."""
+    data = request.get_json(cache=False, silent=True)
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+
+def _derive_short_code(name):
+    """Default short code for a category: its first three letters, upper-cased."""
+    # Interned because the same few codes end up on every label row
+    return sys.intern(name[:3].upper())
+
+
+def _read_labels():
+    """Parse the labels CSV into a list of row dicts."""
+    labels = []
+    # utf-8-sig drops the BOM Excel puts in front of "CSV UTF-8" files
+    with open(LABELS_FILE, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            label = {col: row.get(col) or "" for col in LABEL_COLUMNS}
+            year = label["StartYear"]
+            try:
+                label["StartYear"] = int(year)
+            except ValueError:
+                # Files last written by pandas may hold years as "2012.0"
+                try:
+                    label["StartYear"] = int(float(year))
+                except (ValueError, OverflowError):
+                    pass
+            labels.append(label)
+    return labels
+
+
+def load_labels(copy_rows=True):
+    """
+    Load labels from CSV file as a list of row dicts (cached until the file changes).
+    
+    Read-only callers may pass copy_rows=False to get the cached rows themselves;
+    they must not modify them.
+    """
+    try:
+        source = _file_source(LABELS_FILE)
+    except FileNotFoundError:
+        # Created at startup, so only missing if removed while running
+        return []
+    if _LABELS_CACHE["source"] != source:
+        _LABELS_CACHE["labels"] = _read_labels()
+        _LABELS_CACHE["source"] = source
+    if not copy_rows:
+        return _LABELS_CACHE["labels"]
+    # Copy rows so handlers can edit them without touching the cache
+    return [dict(label) for label in _LABELS_CACHE["labels"]]
+
+
+def save_labels(labels):
     """Save labels to CSV file."""
-    df.to_csv(LABELS_FILE, index=False)
+    with _atomic_open(LABELS_FILE, newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=LABEL_COLUMNS, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(labels)
+    _LABELS_CACHE["source"] = None
+
+
+def append_label(label):
+    """Append a single label to the CSV file without rewriting existing rows."""
+    try:
+        size = LABELS_FILE.stat().st_size
+    except FileNotFoundError:
+        size = 0
+    if size == 0:
+        save_labels([label])
+        return
+    
+    # Rows are read back by header name, so write them in the file's own order
+    with open(LABELS_FILE, "r", encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f), [])
+    missing = [col for col in LABEL_COLUMNS if col not in header]
+    if missing:
+        # Rewriting would drop whatever the file keeps in its other columns
+        raise ValueError(f"Labels file is missing columns: {', '.join(missing)}")
+    
+    # Files edited by hand may not end with a newline
+    with open(LABELS_FILE, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        needs_newline = f.read(1) not in (b"\n", b"\r")
+    
+    with open(LABELS_FILE, "a", encoding="utf-8", newline="") as f:
+        if needs_newline:
+            f.write("\n")
+        writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore", lineterminator="\n")
+        writer.writerow(label)
+    _LABELS_CACHE["source"] = None
 
 
 @app.route('/')
 def index():
     """Home page."""
+    etag = _page_etag(CONFIG_FILE, LABELS_FILE)
+    if request.if_none_match.contains(etag):
+        return _page_response(None, etag)
+    
     config = load_config()
-    df = load_labels()
-    labels = df.to_dict('records') if not df.empty else []
+    labels = load_labels()
     
-    return render_template('index.html', 
-                         labels=labels, 
-                         config=config,
-                         categories=list(config.get('categories', {}).keys()))
+    return _page_response(render_template('index.html', 
+                                          labels=labels, 
+                                          config=config,
+                                          categories=list(config.get('categories', {}))), etag)
 
 
 @app.route('/settings')
 def settings():
     """Settings editor page."""
+    etag = _page_etag(CONFIG_FILE)
+    if request.if_none_match.contains(etag):
+        return _page_response(None, etag)
+    
     config = load_config()
-    return render_template('settings.html', config=config)
+    return _page_response(render_template('settings.html', config=config), etag)
 
 
 @app.route('/api/config', methods=['GET', 'POST'])
@@ -165,7 +432,7 @@ def api_config():
     
     elif request.method == 'POST':
         try:
-            config = request.json
+            config = _request_data()
             print(f"[DEBUG] Saving config, emergency_text: {config['style'].get('emergency_text', 'NOT FOUND')[:50]}...")
             save_config(config)
             print(f"[DEBUG] Config saved to {CONFIG_FILE}")
@@ -179,13 +446,11 @@ def api_config():
 def api_labels():
     """API endpoint for managing labels."""
     if request.method == 'GET':
-        df = load_labels()
-        return jsonify(df.to_dict('records'))
+        return jsonify(load_labels())
     
     elif request.method == 'POST':
         try:
-            data = request.json
-            df = load_labels()
+            data = _request_data()
             config = load_config()
             
             # Auto-generate ShortCode from category short_code + year
@@ -193,7 +458,7 @@ def api_labels():
             start_year = int(data.get('StartYear', 2020))
             
             # Get category short code from config
-            category_short_code = config.get('categories', {}).get(category, {}).get('short_code', category[:3].upper())
+            category_short_code = config.get('categories', {}).get(category, {}).get('short_code') or _derive_short_code(category)
             auto_short_code = f"{category_short_code}-{start_year}"
             
             # Get format, use first available if not specified
@@ -209,29 +474,30 @@ def api_labels():
             if 'index' in data:
                 # Update existing label
                 idx = data['index']
-                if idx < len(df):
-                    df.at[idx, 'Category'] = category
-                    df.at[idx, 'ShortCode'] = auto_short_code
-                    df.at[idx, 'StartYear'] = start_year
-                    df.at[idx, 'Subcategories'] = data.get('Subcategories', '')
-                    df.at[idx, 'Format'] = format_value
+                labels = load_labels()
+                if idx < len(labels):
+                    labels[idx].update({
+                        'Category': category,
+                        'ShortCode': auto_short_code,
+                        'StartYear': start_year,
+                        'Subcategories': data.get('Subcategories', ''),
+                        'Format': format_value
+                    })
                 else:
                     return jsonify({"success": False, "message": "Invalid label index"}), 400
+                save_labels(labels)
             else:
                 # Add new label
-                new_row = {
+                append_label({
                     'Category': category,
                     'ShortCode': auto_short_code,
                     'StartYear': start_year,
                     'Subcategories': data.get('Subcategories', ''),
                     'Format': format_value
-                }
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+                })
             
-            save_labels(df)
             return jsonify({"success": True, "message": "Label saved successfully"})
         except Exception as e:
-            import traceback
             traceback.print_exc()
             return jsonify({"success": False, "message": str(e)}), 400
     
@@ -241,16 +507,15 @@ def api_labels():
             if idx is None:
                 return jsonify({"success": False, "message": "No index provided"}), 400
             
-            df = load_labels()
+            labels = load_labels()
             
-            if idx < 0 or idx >= len(df):
+            if idx < 0 or idx >= len(labels):
                 return jsonify({"success": False, "message": "Invalid label index"}), 400
             
-            df = df.drop(idx).reset_index(drop=True)
-            save_labels(df)
+            del labels[idx]
+            save_labels(labels)
             return jsonify({"success": True, "message": "Label deleted successfully"})
         except Exception as e:
-            import traceback
             traceback.print_exc()
             return jsonify({"success": False, "message": str(e)}), 400
 
@@ -263,15 +528,16 @@ def api_category(category_name=None):
     
     if request.method == 'POST':
         try:
-            data = request.json
+            data = _request_data()
             name = data.get('name')
             color = data.get('color', '#000000')
-            short_code = data.get('short_code', name[:3].upper())
             is_emergency = data.get('is_emergency', False)
             
             if not name:
                 return jsonify({"success": False, "message": "Category name required"}), 400
             
+            short_code = data.get('short_code') or _derive_short_code(name)
+            
             if 'categories' not in config:
                 config['categories'] = {}
             
@@ -288,15 +554,16 @@ def api_category(category_name=None):
     
     elif request.method == 'PUT':
         try:
-            data = request.json
+            data = _request_data()
             new_name = data.get('name')
             color = data.get('color', '#000000')
-            short_code = data.get('short_code', new_name[:3].upper())
             is_emergency = data.get('is_emergency', False)
             
             if not new_name:
                 return jsonify({"success": False, "message": "Category name required"}), 400
             
+            short_code = data.get('short_code') or _derive_short_code(new_name)
+            
             if category_name not in config.get('categories', {}):
                 return jsonify({"success": False, "message": "Category not found"}), 404
             
@@ -338,9 +605,9 @@ def preview():
     """Preview labels in browser (printable page with HTML labels)."""
     try:
         config = load_config()
-        df = load_labels()
+        labels = load_labels(copy_rows=False)
         
-        if df.empty:
+        if not labels:
             return "No labels to preview. Please add some labels first.", 400
         
         # Filter by checkbox selection if indices parameter is provided
@@ -348,15 +615,14 @@ def preview():
         if indices_param:
             try:
                 indices = [int(idx) for idx in indices_param.split(',')]
-                df = df.iloc[indices]
+                labels = [labels[idx] for idx in indices]
             except (ValueError, IndexError) as e:
                 return f"Invalid indices parameter: {str(e)}", 400
         
         # Generate HTML labels for browser printing
-        generator = LabelGenerator(config)
+        generator = get_generator(config)
         labels_html = []
-        max_label_width = 0
-        max_label_height = 0
+        formats_used = set()
         
         # Validate that we have at least one label size configured
         if not config.get('label_sizes'):
@@ -365,19 +631,14 @@ def preview():
         # Get first available format as default fallback
         first_format = next(iter(config['label_sizes']))
         
-        for _, row in df.iterrows():
-            fmt = str(row.get("Format", first_format)).strip().lower()
-            subcats = str(row.get("Subcategories", "")).replace(",", ";").split(";")
-            subcats = [s.strip() for s in subcats if s.strip()]
+        for row in labels:
+            fmt = str(row.get("Format") or first_format).strip().lower()
+            subcats = split_subcategories(str(row.get("Subcategories", "")))
             
             # Use first available format if requested format not found
             if fmt not in config['label_sizes']:
                 fmt = first_format
-            
-            width = config['label_sizes'][fmt]['width_mm']
-            height = config['label_sizes'][fmt]['height_mm']
-            max_label_width = max(max_label_width, width)
-            max_label_height = max(max_label_height, height)
+            formats_used.add(fmt)
             
             # Render each label using the HTML template
             label_html = generator.render_label_template(
@@ -389,6 +650,10 @@ def preview():
             )
             labels_html.append(label_html)
         
+        # Page layout only depends on the largest format in use
+        max_label_width = max(generator.size_lut[f][0] for f in formats_used)
+        max_label_height = max(generator.size_lut[f][1] for f in formats_used)
+        
         # Determine orientation based on label dimensions
         # If labels can fit 2 or more side-by-side in portrait, use portrait
         # Otherwise use landscape
@@ -418,33 +683,30 @@ def preview():
 def download():
     """Download labels as PDF."""
     try:
-        from datetime import datetime
-        
         config = load_config()
-        df = load_labels()
+        labels = load_labels(copy_rows=False)
         
-        if df.empty:
+        if not labels:
             return "No labels to download. Please add some labels first.", 400
         
-        generator = LabelGenerator(config)
-        pdf_bytes = generator.generate_pdf(df)
-        
         # Generate unique filename with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'leitz_labels_{timestamp}.pdf'
         
-        return send_file(
-            BytesIO(pdf_bytes),
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=filename
-        )
+        # Let ReportLab write the PDF straight into the response body
+        response = Response(mimetype='application/pdf')
+        get_generator(config).write_pdf(labels, response.stream)
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        return response
     except Exception as e:
         return f"Error generating PDF: {str(e)}", 500
 
 
+# Create data files once at import, so WSGI servers loading app:app get them too
+ensure_data_directory()
+
+
 if __name__ == '__main__':
-    ensure_data_directory()
     print("\n" + "="*60)
     print("  LEITZ Label Generator - Web Interface")
     print("="*60)
@@ -454,4 +716,6 @@ if __name__ == '__main__':
     print("\n  Open your browser and go to: http://127.0.0.1:5000")
     print("="*60 + "\n")
     
-    app.run(debug=True, host='127.0.0.1', port=5000)
+    # The reloading debug server is opt-in; see README for production serving
+    debug = os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes')
+    app.run(debug=debug, host='127.0.0.1', port=5000)
@@ -7,19 +7,129 @@ Uses Jinja2 templates for flexible label design.
 
 import os
 import yaml
-from typing import List, Dict, Any
+import zlib
+from typing import Dict, Any, BinaryIO, Iterable, Sequence, Tuple
 from io import BytesIO
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
-import pandas as pd
 from jinja2 import Environment, FileSystemLoader
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
+from reportlab.pdfgen.pathobject import PDFPathObject
+from reportlab.lib.rl_accel import fp_str
 from reportlab.lib.units import mm
 from reportlab.lib.colors import Color, black, white, HexColor
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
+# Prefer the libyaml-backed loader, fall back to pure Python
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+# ReportLab 4+ ships its C accelerator as the separate rl_accel package;
+# without it escaping and string widths run in pure Python
+try:
+    import _rl_accel  # noqa: F401
+    _HAVE_RL_ACCEL = True
+except ImportError:
+    _HAVE_RL_ACCEL = False
+_rl_accel_warned = False
+
+
+@lru_cache(maxsize=1024)
+def split_subcategories(value: str) -> Tuple[str, ...]:
+    """Split a Subcategories cell on ';' or ',' into stripped, non-empty entries."""
+    return tuple(s.strip() for s in value.replace(",", ";").split(";") if s.strip())
+
+
+# (font name, font size) -> width of each printable ASCII character
+_WIDTH_CACHE: Dict[Tuple[str, float], Dict[str, float]] = {}
+
+
+def _char_widths(font_name: str, font_size: float) -> Dict[str, float]:
+    """Return the cached ASCII character width table for a font and size."""
+    key = (font_name, font_size)
+    widths = _WIDTH_CACHE.get(key)
+    if widths is None:
+        widths = {chr(i): pdfmetrics.stringWidth(chr(i), font_name, font_size) for i in range(32, 127)}
+        _WIDTH_CACHE[key] = widths
+    return widths
+
+
+def _snap(v: float) -> float:
+    """Round a coordinate to 0.1 pt, well below what a printer resolves."""
+    return round(v, 1)
+
+
+@lru_cache(maxsize=None)
+def _register_dejavu(regular_path: str, bold_path: str) -> None:
+    """
+    Register the DejaVu TTFs once per process; failures are not cached.
+    ReportLab keeps the first file registered under a font name, so changed
+    font paths only take effect after a restart.
+    """
+    pdfmetrics.registerFont(TTFont("DejaVuSans", regular_path))
+    pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", bold_path))
+
+
+def _text_width(text: str, font_name: str, font_size: float) -> float:
+    """Measure text from the cached width table, falling back to stringWidth for non-ASCII."""
+    widths = _char_widths(font_name, font_size)
+    try:
+        return sum(widths[ch] for ch in text)
+    except KeyError:
+        return pdfmetrics.stringWidth(text, font_name, font_size)
+
+
+@dataclass(frozen=True)
+class LabelMetrics:
+    """Style lengths used while drawing labels, converted to PDF points once."""
+    margin_left: float
+    margin_right: float
+    margin_top: float
+    gutter: float
+    padding: float
+    top_bar_height: float
+    
+    @classmethod
+    def from_style(cls, style: Dict[str, Any]) -> "LabelMetrics":
+        return cls(
+            margin_left=style["page_margin_l_mm"] * mm,
+            margin_right=style["page_margin_r_mm"] * mm,
+            margin_top=style.get("page_margin_t_mm", 15) * mm,
+            gutter=style["gutter_x_mm"] * mm,
+            padding=style["padding"] * mm,
+            top_bar_height=style["top_bar_height_mm"] * mm,
+        )
+
+
+class _StatefulCanvas(canvas.Canvas):
+    """Canvas that drops fill colour and font changes which would not change the graphics state."""
+    
+    def setFillColor(self, aColor, alpha=None):
+        if alpha is None and aColor == self._fillColorObj:
+            return
+        super().setFillColor(aColor, alpha)
+    
+    def setFont(self, psfontname, size, leading=None):
+        if leading is None:
+            leading = size * 1.2
+        if psfontname == self._fontname and size == self._fontsize and leading == self._leading:
+            return
+        super().setFont(psfontname, size, leading)
+    
+    def drawText(self, aTextObject):
+        super().drawText(aTextObject)
+        # Font and colour set inside a text object outlive its BT/ET
+        self._fontname = aTextObject._fontname
+        self._fontsize = aTextObject._fontsize
+        self._leading = aTextObject._leading
+        self._fillColorObj = getattr(aTextObject, "_fillColorObj", self._fillColorObj)
+
 
 class LabelGenerator:
     """Generates LEITZ binder spine labels from configuration and data."""
@@ -36,21 +146,57 @@ class LabelGenerator:
         self.style = config["style"]
         self.categories = config.get("categories", {})
         self.fonts_registered = False
+        # Names of the categories flagged is_emergency, checked once per label
+        self.emergency_categories = frozenset(
+            name for name, info in self.categories.items() if info.get("is_emergency", False)
+        )
+        
+        # Format name -> (width_mm, height_mm), resolved once per config
+        self.size_lut = self._build_size_lut()
+        # Built on first PDF so HTML-only use does not need the page settings
+        self._metrics: LabelMetrics = None
+        # (width, height, is_emergency) in points -> label artwork operators
+        self._geometry_cache: Dict[Tuple[Any, Any, bool], Tuple[str, Tuple[float, ...], str, str, str]] = {}
+        # Colours only depend on category (and year), so compute each once
+        self._base_color_cache: Dict[str, str] = {}
+        self._base_hexcolor_cache: Dict[str, Color] = {}
+        self._accent_cache: Dict[Tuple[str, int], Color] = {}
+        self._accent_hex_cache: Dict[Tuple[str, int], str] = {}
         
         # Setup Jinja2 environment
         if template_dir is None:
             template_dir = Path(__file__).parent / "label_templates"
-        self.jinja_env = Environment(loader=FileSystemLoader(str(template_dir)))
+        # Templates ship with the app, so skip the per-render mtime check
+        self.jinja_env = Environment(loader=FileSystemLoader(str(template_dir)), auto_reload=False)
+        # Resolved on first render so PDF-only use does not need the templates
+        self._label_template = None
+    
+    def _build_size_lut(self) -> Dict[str, Tuple[Any, Any]]:
+        """Map each configured label format to its (width_mm, height_mm)."""
+        # Get label_sizes from config (not style!)
+        label_sizes = self.config.get("label_sizes", {})
+        if not label_sizes and "formats_mm" in self.style:
+            # Backward compatibility: old configs only list widths in formats_mm
+            height_mm = self.style.get("label_height_mm", 120)
+            return {fmt: (width, height_mm) for fmt, width in self.style["formats_mm"].items()}
+        return {fmt: (size.get("width_mm"), size.get("height_mm")) for fmt, size in label_sizes.items()}
+    
+    @property
+    def metrics(self) -> LabelMetrics:
+        """Drawing lengths in PDF points, computed from the style on first use."""
+        if self._metrics is None:
+            self._metrics = LabelMetrics.from_style(self.style)
+        return self._metrics
     
     @classmethod
     def from_yaml(cls, yaml_path: str, template_dir: str = None):
         """Load configuration from YAML file and create generator."""
         with open(yaml_path, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=_Loader)
         return cls(config, template_dir)
     
     def render_label_template(self, category: str, short_code: str, start_year: int, 
-                             subcategories: List[str], format_name: str) -> str:
+                             subcategories: Sequence[str], format_name: str) -> str:
         """
         Render a label using Jinja2 template.
         
@@ -64,33 +210,28 @@ class LabelGenerator:
         Returns:
             Rendered template string
         """
-        template = self.jinja_env.get_template("binder_label.jinja2")
+        template = self._label_template
+        if template is None:
+            template = self._label_template = self.jinja_env.get_template("binder_label.jinja2")
         
-        # Get label dimensions from config (not style!)
-        label_sizes = self.config.get("label_sizes", {})
-        
-        if not label_sizes:
+        if not self.size_lut:
             raise ValueError("No label sizes configured in config. Please add at least one label size.")
         
         # Try to get the requested format, fallback to first available if not found
-        if format_name not in label_sizes:
-            format_name = next(iter(label_sizes))  # Get first key
-            print(f"Warning: Format '{format_name}' not found, using '{format_name}' instead")
+        if format_name not in self.size_lut:
+            fallback = next(iter(self.size_lut))  # Get first key
+            print(f"Warning: Format '{format_name}' not found, using '{fallback}' instead")
+            format_name = fallback
         
-        format_config = label_sizes[format_name]
-        width_mm = format_config.get("width_mm")
-        height_mm = format_config.get("height_mm")
+        width_mm, height_mm = self.size_lut[format_name]
         
         if width_mm is None or height_mm is None:
             raise ValueError(f"Label size '{format_name}' is missing width_mm or height_mm")
         
         base_color = self.get_base_color(category)
-        accent_color = self.get_accent_color(category, start_year)
-        accent_color_hex = self.color_to_hex(accent_color)  # Convert to hex for HTML
+        accent_color_hex = self.get_accent_hex(category, start_year)
         
-        # Check if this is an emergency category
-        cat_info = self.categories.get(category, {})
-        is_emergency = cat_info.get("is_emergency", False)
+        is_emergency = category in self.emergency_categories
         emergency_text = self.style.get("emergency_text", "NOTFALL")
         
         context = {
@@ -116,8 +257,7 @@ class LabelGenerator:
             return
         
         try:
-            pdfmetrics.registerFont(TTFont("DejaVuSans", self.style["font_path_regular"]))
-            pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", self.style["font_path_bold"]))
+            _register_dejavu(self.style["font_path_regular"], self.style["font_path_bold"])
             self.fonts_registered = True
         except Exception as e:
             print(f"Warning: Could not register custom fonts: {e}")
@@ -155,8 +295,8 @@ class LabelGenerator:
     
     def hash_color_from_string(self, name: str) -> str:
         """Generate a consistent color from a string name."""
-        import hashlib
-        h = int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:8], 16)
+        # CRC32 is plenty for spreading hues and, unlike hash(), stable across runs
+        h = zlib.crc32(name.encode("utf-8"))
         H = (h % 36000) / 100.0
         S = 0.45 + ((h >> 8) % 2000) / 2000.0 * 0.20
         L = 0.45 + ((h >> 16) % 1500) / 1500.0 * 0.15
@@ -167,224 +307,351 @@ class LabelGenerator:
         c = (1 - abs(2*l - 1)) * s
         x = c * (1 - abs(((h/60) % 2) - 1))
         m = l - c/2
-        if 0 <= h < 60:   r1, g1, b1 = c, x, 0
-        elif 60 <= h < 120: r1, g1, b1 = x, c, 0
-        elif 120 <= h < 180: r1, g1, b1 = 0, c, x
-        elif 180 <= h < 240: r1, g1, b1 = 0, x, c
-        elif 240 <= h < 300: r1, g1, b1 = x, 0, c
-        else:                r1, g1, b1 = c, 0, x
+        # Each 60 degree hue sector is a fixed permutation of (c, x, 0)
+        r1, g1, b1 = ((c, x, 0), (x, c, 0), (0, c, x),
+                      (0, x, c), (x, 0, c), (c, 0, x))[int(h // 60) % 6]
         r, g, b = (r1 + m), (g1 + m), (b1 + m)
         return "#%02x%02x%02x" % (int(r*255), int(g*255), int(b*255))
     
     def get_base_color(self, cat: str) -> str:
         """Get base color for a category."""
-        return self.categories.get(cat, {}).get("base_color", self.hash_color_from_string(cat))
+        base_hex = self._base_color_cache.get(cat)
+        if base_hex is None:
+            cat_info = self.categories.get(cat, {})
+            if "base_color" in cat_info:
+                base_hex = cat_info["base_color"]
+            else:
+                base_hex = self.hash_color_from_string(cat)
+            self._base_color_cache[cat] = base_hex
+        return base_hex
+    
+    def get_base_hexcolor(self, cat: str) -> Color:
+        """Get base color for a category as a ReportLab Color."""
+        base = self._base_hexcolor_cache.get(cat)
+        if base is None:
+            base = self._base_hexcolor_cache[cat] = HexColor(self.get_base_color(cat))
+        return base
     
     def get_accent_color(self, cat: str, start_year: int) -> Color:
         """Get accent color based on category and year (gradient to white for newer years)."""
-        year_min = self.style["year_min"]
-        year_max = self.style["year_max"]
-        base_hex = self.get_base_color(cat)
+        key = (cat, start_year)
+        accent = self._accent_cache.get(key)
+        if accent is not None:
+            return accent
         
         # Emergency categories don't get year-based gradient
-        cat_info = self.categories.get(cat, {})
-        if cat_info.get("is_emergency", False):
-            return HexColor(base_hex)
+        if cat in self.emergency_categories:
+            accent = self.get_base_hexcolor(cat)
+        else:
+            year_min = self.style["year_min"]
+            year_max = self.style["year_max"]
+            t = self.clamp((start_year - year_min) / float(year_max - year_min), 0.0, 1.0)
+            accent = self.mix_to_white(self.get_base_color(cat), t)
         
-        t = self.clamp((start_year - year_min) / float(year_max - year_min), 0.0, 1.0)
-        return self.mix_to_white(base_hex, t)
+        self._accent_cache[key] = accent
+        return accent
+    
+    def get_accent_hex(self, cat: str, start_year: int) -> str:
+        """Get the accent color as a hex string for HTML."""
+        key = (cat, start_year)
+        accent_hex = self._accent_hex_cache.get(key)
+        if accent_hex is None:
+            accent_hex = self._accent_hex_cache[key] = self.color_to_hex(self.get_accent_color(cat, start_year))
+        return accent_hex
     
     def draw_wrapped_text(self, c: canvas.Canvas, x, y, w, text, font_name, font_size, leading=None):
         """Draw text with word wrapping."""
         if leading is None:
             leading = font_size * 1.15
+        space_w = _char_widths(font_name, font_size)[" "]
         words = text.split()
         line = ""
+        line_w = 0.0
         for word in words:
-            test = (line + " " + word).strip()
-            if pdfmetrics.stringWidth(test, font_name, font_size) <= w:
-                line = test
+            # Grow the line width incrementally instead of re-measuring it
+            word_w = _text_width(word, font_name, font_size)
+            test_w = line_w + space_w + word_w if line else word_w
+            if test_w <= w:
+                line = line + " " + word if line else word
+                line_w = test_w
             else:
                 c.drawString(x, y, line)
                 y -= leading
                 line = word
+                line_w = word_w
         if line:
             c.drawString(x, y, line)
         return y
     
-    def draw_label(self, c, x0, y0, w_mm, h_mm, cat, short, year, subcats):
-        """Draw a single label on the canvas."""
-        w = w_mm * mm
-        h = h_mm * mm
-        pad = self.style["padding"] * mm
-    
-        accent = self.get_accent_color(cat, year)
-        base = HexColor(self.get_base_color(cat))
+    def _label_geometry(self, w, h, is_emergency) -> Tuple[str, Tuple[float, ...], str, str, str]:
+        """
+        Build the PDF operators for a label's artwork, relative to the
+        label's lower-left corner.
+        
+        Paint order follows the artwork: border, emergency border and top bar
+        first, then the timeline, so the timeline stays visible on labels
+        short enough for it to reach into the bar.
+        
+        Returns:
+            (timeline form name, form bounding box, timeline operators shared
+            by every label of this size, template for the operators painted
+            before the text, template for the coloured timeline parts painted
+            after the form; templates have {accent}/{base} placeholders)
+        """
+        key = (w, h, is_emergency)
+        geometry = self._geometry_cache.get(key)
+        if geometry is not None:
+            return geometry
+        
+        bar_h = self.metrics.top_bar_height
         
-        # Check if category is marked as emergency
-        cat_info = self.categories.get(cat, {})
-        is_emergency = cat_info.get("is_emergency", False)
-    
         # Border
-        c.setStrokeColor(black)
-        c.rect(x0, y0, w, h, stroke=1, fill=0)
-    
+        underlay = ["0 0 0 RG", "n %s re S" % fp_str(0, 0, w, h)]
+        
         # Emergency border (if category is marked as emergency)
         if is_emergency:
-            c.setStrokeColor(base)
-            c.setLineWidth(self.style.get("notfall_border_mm", 3) * mm / 3.0)
-            c.rect(x0 + 1.2, y0 + 1.2, w - 2.4, h - 2.4, stroke=1, fill=0)
-    
+            underlay.append("{base} RG")
+            underlay.append("%s w" % fp_str(self.style.get("notfall_border_mm", 3) * mm / 3.0))
+            underlay.append("n %s re S" % fp_str(1.2, 1.2, w - 2.4, h - 2.4))
+        
         # Top bar
-        bar_h = self.style["top_bar_height_mm"] * mm
-        c.setFillColor(accent)
-        c.rect(x0, y0 + h - bar_h, w, bar_h, stroke=0, fill=1)
+        underlay.append("{accent} rg")
+        underlay.append("n %s re f" % fp_str(0, h - bar_h, w, bar_h))
+        
+        # Timeline - Vertical with circles, blank lines for handwriting.
+        # Shapes sharing a stroke colour and width go into one path, so each
+        # group is a single stroke. On emergency labels the two lowest circles
+        # take the emergency border's colour and width, and the line over the
+        # second is drawn after them.
+        timeline_x = w / 2
+        timeline_start_y = 30
+        circle_radius = 3 * mm
+        circle_gap = 12 * mm
+        line_half = 7.5 * mm
+        thick_circles = PDFPathObject()
+        thin_circles = PDFPathObject()
+        static_lines = PDFPathObject()
+        coloured_line = PDFPathObject()
+        for i in range(4):
+            y_pos = timeline_start_y + (i * circle_gap)
+            (thick_circles if i < 2 else thin_circles).circle(timeline_x, y_pos, circle_radius)
+            if i > 0:
+                lines = coloured_line if is_emergency and i == 1 else static_lines
+                lines.moveTo(timeline_x - line_half, y_pos - 3 * mm)
+                lines.lineTo(timeline_x + line_half, y_pos - 3 * mm)
+        
+        static = ["0 0 0 RG"]
+        overlay = []
+        if is_emergency:
+            overlay.append("{base} RG")
+            overlay.append("%s w" % fp_str(self.style.get("notfall_border_mm", 3) * mm / 3.0))
+            overlay.append(thick_circles.getCode() + " S")
+            overlay.append("%s RG %s w" % (fp_str(0.8, 0.8, 0.8), fp_str(0.5)))
+            overlay.append(coloured_line.getCode() + " S")
+        else:
+            static.append("%s w" % fp_str(1))
+            static.append(thick_circles.getCode() + " S")
+        static.append("%s w" % fp_str(0.5))
+        static.append(thin_circles.getCode() + " S")
+        static.append("%s RG" % fp_str(0.8, 0.8, 0.8))
+        static.append(static_lines.getCode() + " S")
+        
+        # The form only clips to its bounding box, so cover the whole
+        # timeline (plus stroke width) even where it runs past the label
+        bbox = (
+            timeline_x - line_half - 2,
+            timeline_start_y - circle_radius - 2,
+            timeline_x + line_half + 2,
+            timeline_start_y + 3 * circle_gap + circle_radius + 2,
+        )
+        form_name = "timeline_%gx%g%s" % (w, h, "_emergency" if is_emergency else "")
+        geometry = (form_name, bbox, "\n".join(static), "\n".join(underlay), "\n".join(overlay))
+        self._geometry_cache[key] = geometry
+        return geometry
+    
+    def draw_label(self, c, x0, y0, w, h, cat, short, year, subcats):
+        """Draw a single label of w x h points with its lower-left corner at (x0, y0)."""
+        # Bound once; these are read several times for every label
+        style = self.style
+        metrics = self.metrics
+        font_bold = style["font_bold"]
+        pad = metrics.padding
+        bar_h = metrics.top_bar_height
+    
+        accent = self.get_accent_color(cat, year)
+        base = self.get_base_hexcolor(cat)
+        
+        is_emergency = cat in self.emergency_categories
+        
+        # The timeline shared by every label of this size is a form XObject
+        # built once per document; the coloured parts are emitted per label
+        form_name, bbox, static_ops, underlay_ops, overlay_ops = self._label_geometry(w, h, is_emergency)
+        if not c.hasForm(form_name):
+            c.beginForm(form_name, *bbox)
+            c._code.append(static_ops)
+            c.endForm()
+        accent_rgb = fp_str(accent.red, accent.green, accent.blue)
+        base_rgb = fp_str(base.red, base.green, base.blue)
+        origin = (_snap(x0), _snap(y0))
+        
+        # Border, emergency border and top bar
+        c.saveState()
+        c.translate(*origin)
+        c._code.append(underlay_ops.format(accent=accent_rgb, base=base_rgb))
+        c.restoreState()
     
         # Use contrast color for text on colored background
         text_color = self.get_text_contrast_color(accent)
         c.setFillColor(text_color)
-        c.setFont(self.style["font_bold"], self.style["font_size_header"])
-        c.drawString(x0 + pad, y0 + h - bar_h + pad + 7, cat)
-        c.setFont(self.style["font_regular"], self.style["font_size_subheader"])
-        c.drawString(x0 + pad, y0 + h - bar_h + pad - 2, f"{short}-{year}")
+        c.setFont(font_bold, style["font_size_header"])
+        c.drawString(_snap(x0 + pad), _snap(y0 + h - bar_h + pad + 7), cat)
+        c.setFont(style["font_regular"], style["font_size_subheader"])
+        c.drawString(_snap(x0 + pad), _snap(y0 + h - bar_h + pad - 2), f"{short}-{year}")
     
-        # Content area
+        # Content area: header and bullets go out as one BT/ET text object,
+        # each line advancing by the leading set with its font
         y_text = y0 + h - bar_h - 8 * mm
         c.setFillColor(black)
-        c.setFont(self.style["font_bold"], self.style["font_size_body"])
-        c.drawString(x0 + pad, y_text, "Contents:")
-        c.setFont(self.style["font_regular"], self.style["font_size_body"] - 1)
+        text = c.beginText(_snap(x0 + pad), _snap(y_text))
+        text.setFont(font_bold, style["font_size_body"], 10)
+        text.textLine("Contents:")
+        text.setFont(style["font_regular"], style["font_size_body"] - 1, 9)
         y_text -= 10
         # Limit to 5 subcategories for 150mm height
         for s in subcats[:5]:
-            c.drawString(x0 + pad, y_text, f"• {s}")
+            text.textLine("• " + s)
             y_text -= 9
             if y_text < y0 + 60:
                 break
+        c.drawText(text)
     
-        # Timeline - Vertical with circles
-        timeline_x = x0 + w / 2
-        timeline_start_y = y0 + 30
-        circle_radius = 3 * mm
-        circle_gap = 12 * mm
-        
-        c.setFont(self.style["font_regular"], 7)
-        # First circle with year label
-        c.circle(timeline_x, timeline_start_y, circle_radius, stroke=1, fill=0)
-        c.setFont(self.style["font_bold"], 7)
-        c.drawCentredString(timeline_x, timeline_start_y - 5 * mm, str(year))
-        
-        # Additional circles with blank lines
-        c.setFont(self.style["font_regular"], 6)
-        for i in range(1, 4):
-            y_pos = timeline_start_y + (i * circle_gap)
-            c.circle(timeline_x, y_pos, circle_radius, stroke=1, fill=0)
-            # Draw blank line for handwriting
-            c.setStrokeColor(Color(0.8, 0.8, 0.8))
-            c.setLineWidth(0.5)
-            c.line(timeline_x - 7.5 * mm, y_pos - 3 * mm, timeline_x + 7.5 * mm, y_pos - 3 * mm)
-            c.setStrokeColor(black)
+        # Timeline, on top of the bar and text like the rest of the artwork
+        c.saveState()
+        c.translate(*origin)
+        c.doForm(form_name)
+        if overlay_ops:
+            c._code.append(overlay_ops.format(base=base_rgb))
+        c.restoreState()
+    
+        # Year label under the first timeline circle
+        # Centred strings are placed from the cached width tables, so the
+        # start position can be snapped as well
+        year_text = str(year)
+        c.setFont(font_bold, 7)
+        c.drawString(_snap(x0 + (w - _text_width(year_text, font_bold, 7)) / 2),
+                     _snap(y0 + 30 - 5 * mm), year_text)
     
         # Emergency text
         if is_emergency:
-            c.setFont(self.style["font_bold"], 5)
+            c.setFont(font_bold, 5)
             c.setFillColor(black)
             # Get emergency text from config
-            emergency_text = self.style.get("emergency_text", "IN CASE OF EMERGENCY:\nTake this binder when leaving due to fire or flood!")
+            emergency_text = style.get("emergency_text", "IN CASE OF EMERGENCY:\nTake this binder when leaving due to fire or flood!")
             lines = emergency_text.split("\n")
             # Position in middle area, limit to 4 lines
             cy = y0 + h * 0.45
             for i, line in enumerate(lines[:4]):
                 if len(line) > 35:  # Truncate long lines
                     line = line[:32] + "..."
-                c.drawCentredString(x0 + w / 2, cy - i * 6, line)
+                line_w = _text_width(line, font_bold, 5)
+                c.drawString(_snap(x0 + (w - line_w) / 2), _snap(cy - i * 6), line)
     
-    def paginate_and_draw(self, df, c):
-        """Paginate labels and draw them on the canvas."""
+    def paginate_and_draw(self, labels: Iterable[Dict[str, Any]], c):
+        """Paginate labels and draw them on the canvas, consuming the rows one at a time."""
         page_w, page_h = A4
-        left = self.style["page_margin_l_mm"] * mm
-        right = self.style["page_margin_r_mm"] * mm
-        top = self.style.get("page_margin_t_mm", 15) * mm
-        
-        # Get label_sizes from config (not style!)
-        label_sizes = self.config.get("label_sizes", {})
-        if not label_sizes and "formats_mm" in self.style:
-            # Backward compatibility: convert old formats_mm to label_sizes structure
-            label_sizes = {
-                fmt: {"width_mm": width, "height_mm": self.style.get("label_height_mm", 120)}
-                for fmt, width in self.style["formats_mm"].items()
-            }
+        metrics = self.metrics
+        left = metrics.margin_left
+        right_edge = page_w - metrics.margin_right
         
-        if not label_sizes:
+        size_lut = self.size_lut
+        if not size_lut:
             raise ValueError("No label sizes configured in config. Please add at least one label size.")
         
         # Get first available format as fallback
-        first_format_name = next(iter(label_sizes))
+        first_format_name = next(iter(size_lut))
         
-        gutter = self.style["gutter_x_mm"] * mm
         x = left
+        
+        # Raw Format cell -> (width, height, y position) in points; rows share
+        # a handful of values
+        resolved_sizes = {}
     
-        for _, row in df.iterrows():
-            fmt = str(row.get("Format", first_format_name)).strip().lower()
-            
-            # Get dimensions from label_sizes, use first available if format not found
-            if fmt not in label_sizes:
-                print(f"Warning: Format '{fmt}' not found, using '{first_format_name}' instead")
-                fmt = first_format_name
-            
-            format_config = label_sizes[fmt]
-            w_mm = format_config.get("width_mm")
-            h_mm = format_config.get("height_mm")
+        for row in labels:
+            raw_fmt = row.get("Format")
+            size = resolved_sizes.get(raw_fmt)
+            if size is None:
+                fmt = str(raw_fmt or first_format_name).strip().lower()
+                
+                # Get dimensions from label_sizes, use first available if format not found
+                if fmt not in size_lut:
+                    print(f"Warning: Format '{fmt}' not found, using '{first_format_name}' instead")
+                    fmt = first_format_name
+                
+                w_mm, h_mm = size_lut[fmt]
+                if w_mm is None or h_mm is None:
+                    raise ValueError(f"Label size '{fmt}' is missing width_mm or height_mm")
+                # Position labels from top instead of bottom
+                size = (w_mm * mm, h_mm * mm, page_h - metrics.margin_top - h_mm * mm)
+                resolved_sizes[raw_fmt] = size
+            w, h, y_position = size
             
-            if w_mm is None or h_mm is None:
-                raise ValueError(f"Label size '{fmt}' is missing width_mm or height_mm")
-            
-            if x + w_mm * mm > page_w - right:
+            if x + w > right_edge:
                 c.showPage()
                 x = left
             
-            # Position labels from top instead of bottom
-            y_position = page_h - top - h_mm * mm
-            
-            sub = str(row.get("Subcategories", "")).replace(",", ";").split(";")
-            sub = [s.strip() for s in sub if s.strip()]
+            sub = split_subcategories(str(row.get("Subcategories", "")))
             self.draw_label(
                 c,
                 x,
                 y_position,
-                w_mm,
-                h_mm,
+                w,
+                h,
                 row["Category"],
                 row["ShortCode"],
                 int(row["StartYear"]),
                 sub,
             )
-            x += w_mm * mm + gutter
+            x += w + metrics.gutter
     
-    def generate_pdf(self, df: pd.DataFrame, output_path: str = None) -> bytes:
+    def write_pdf(self, labels: Iterable[Dict[str, Any]], stream: BinaryIO, compress: bool = True):
         """
-        Generate PDF from dataframe.
+        Draw labels and write the finished PDF to a writable binary stream.
         
         Args:
-            df: DataFrame with columns: Category, ShortCode, StartYear, Subcategories, Format
+            labels: Iterable of dicts with keys: Category, ShortCode, StartYear, Subcategories, Format;
+                a generator works, so rows can be streamed from their source
+            stream: File-like object with a write() method
+            compress: Deflate page streams. Turning it off roughly halves render
+                time for large batches but about doubles the file size.
+        """
+        global _rl_accel_warned
+        if not _HAVE_RL_ACCEL and not _rl_accel_warned:
+            print("Warning: ReportLab C accelerator not found, PDF generation will be slower "
+                  "(pip install rl_accel)")
+            _rl_accel_warned = True
+        
+        self.register_fonts()
+        c = _StatefulCanvas(stream, pagesize=A4, pageCompression=int(compress))
+        self.paginate_and_draw(labels, c)
+        c.save()
+    
+    def generate_pdf(self, labels: Iterable[Dict[str, Any]], output_path: str = None,
+                     compress: bool = True) -> bytes:
+        """
+        Generate PDF from label rows.
+        
+        Args:
+            labels: Iterable of dicts with keys: Category, ShortCode, StartYear, Subcategories, Format
             output_path: Optional path to save PDF file. If None, returns bytes only.
+            compress: Deflate page streams (see write_pdf)
         
         Returns:
             PDF content as bytes
         """
-        self.register_fonts()
-        
+        # Always build in memory; the file (if any) is written from the same bytes
+        buffer = BytesIO()
+        self.write_pdf(labels, buffer, compress)
+        data = buffer.getvalue()
         if output_path:
-            c = canvas.Canvas(output_path, pagesize=A4)
-            self.paginate_and_draw(df, c)
-            c.save()
-            
-            with open(output_path, 'rb') as f:
-                return f.read()
-        else:
-            # Generate in memory
-            buffer = BytesIO()
-            c = canvas.Canvas(buffer, pagesize=A4)
-            self.paginate_and_draw(df, c)
-            c.save()
-            return buffer.getvalue()
+            Path(output_path).write_bytes(data)
+        return data